@@ -14,13 +14,17 @@
 # KIND, either express or implied.  See the License for the
 # specific language governing permissions and limitations
 # under the License.
+# pylint: disable=too-many-lines
 
 import logging
 import re
+import sys
 import urllib.parse
 from collections.abc import Iterable, Iterator
 from dataclasses import dataclass
-from typing import Any, cast, Optional
+from functools import lru_cache
+from typing import Any, cast, ClassVar, Optional
+from weakref import WeakValueDictionary
 
 import sqlparse
 from sqlalchemy import and_
@@ -35,6 +39,7 @@ from sqlparse.sql import (
     IdentifierList,
     Parenthesis,
     remove_quotes,
+    Statement,
     Token,
     TokenList,
     Where,
@@ -50,8 +55,8 @@ from sqlparse.tokens import (
     String,
     Whitespace,
 )
-from sqlparse.utils import imt
 
+from superset.constants import LRU_CACHE_MAX_SIZE
 from superset.exceptions import QueryClauseValidationException
 from superset.utils.backports import StrEnum
 
@@ -64,6 +69,17 @@ RESULT_OPERATIONS = {"UNION", "INTERSECT", "EXCEPT", "SELECT"}
 ON_KEYWORD = "ON"
 PRECEDES_TABLE_NAME = {"FROM", "JOIN", "DESCRIBE", "WITH", "LEFT JOIN", "RIGHT JOIN"}
 CTE_PREFIX = "CTE__"
+SOURCE_KEYWORDS = {"FROM", "JOIN"}
+LOGICAL_OPERATORS = {"AND", "OR", "NOT"}
+SANITIZE_CLAUSE_CHARS = ";()/*-#"
+
+# identifiers that are not modified when quoted in table names
+RE_SAFE_IDENTIFIER = re.compile(r"[A-Za-z0-9_~-]+")
+
+# leading whitespace and comments, mirroring the comment tokens used by sqlparse
+RE_LEADING_COMMENTS = re.compile(
+    r"(?:\s+|(?:--|# ).*?(?:\r\n|\r|\n|$)|/\*[\s\S]*?\*/)*"
+)
 
 logger = logging.getLogger(__name__)
 
@@ -72,8 +88,12 @@ logger = logging.getLogger(__name__)
 # reference: https://sqlparse.readthedocs.io/en/stable/extending/
 lex = Lexer.get_default_instance()
 sqlparser_sql_regex = keywords.SQL_REGEX
-sqlparser_sql_regex.insert(25, (r"'(''|\\\\|\\|[^'])*'", sqlparse.tokens.String.Single))
-lex.set_SQL_REGEX(sqlparser_sql_regex)
+string_single_regex = (r"'(''|\\\\|\\|[^'])*'", sqlparse.tokens.String.Single)
+# ``keywords.SQL_REGEX`` is shared by sqlparse, so make sure the pattern is only
+# added (and the lexer regexes recompiled) once, even if this module is reloaded
+if string_single_regex not in sqlparser_sql_regex:
+    sqlparser_sql_regex.insert(25, string_single_regex)
+    lex.set_SQL_REGEX(sqlparser_sql_regex)
 
 
 # mapping between DB engine specs and sqlglot dialects
@@ -134,6 +154,22 @@ class CtasMethod(StrEnum):
     VIEW = "VIEW"
 
 
+@lru_cache(maxsize=LRU_CACHE_MAX_SIZE)
+def _strip_comments(sql: str) -> str:
+    """
+    Strip comments from a SQL string.
+
+    The same SQL is usually checked by several predicates (``is_select``,
+    ``is_explain``, etc.), so the formatted result is memoized. Note that only the
+    resulting string is cached; parsed token trees are mutated by callers (eg,
+    ``insert_rls``) and must not be shared.
+
+    :param sql: SQL string
+    :return: SQL string without comments
+    """
+    return sqlparse.format(sql, strip_comments=True)
+
+
 def _extract_limit_from_query(statement: TokenList) -> Optional[int]:
     """
     Extract limit clause from SQL statement.
@@ -155,6 +191,20 @@ def _extract_limit_from_query(statement: TokenList) -> Optional[int]:
     return None
 
 
+@lru_cache(maxsize=LRU_CACHE_MAX_SIZE)
+def _get_top_regex(top_keywords: frozenset[str]) -> re.Pattern[str]:
+    """
+    Build a regex matching the first TOP-like keyword and the word following it.
+
+    :param top_keywords: keywords that are considered as synonyms to TOP
+    :return: compiled regex, with the keyword and its argument as groups
+    """
+    alternatives = "|".join(
+        re.escape(keyword) for keyword in sorted(top_keywords, key=len, reverse=True)
+    )
+    return re.compile(rf"(?<!\S)({alternatives})(?!\S)\s*(\S*)", re.IGNORECASE)
+
+
 def extract_top_from_query(
     statement: TokenList, top_keywords: set[str]
 ) -> Optional[int]:
@@ -166,19 +216,36 @@ def extract_top_from_query(
     :return: top value extracted from query, None if no top value present in statement
     """
 
-    str_statement = str(statement)
-    str_statement = str_statement.replace("\n", " ").replace("\r", "")
-    token = str_statement.rstrip().split(" ")
-    token = [part for part in token if part]
-    top = None
-    for i, _ in enumerate(token):
-        if token[i].upper() in top_keywords and len(token) - 1 > i:
-            try:
-                top = int(token[i + 1])
-            except ValueError:
-                top = None
-            break
-    return top
+    # words are upper-cased before being compared, so lower case keywords never match
+    upper_keywords = frozenset(
+        keyword for keyword in top_keywords if keyword == keyword.upper()
+    )
+    if not upper_keywords:
+        return None
+
+    match = _get_top_regex(upper_keywords).search(str(statement))
+    if not match:
+        return None
+    try:
+        return int(match.group(2))
+    except ValueError:
+        return None
+
+
+def _starts_with_keyword(sql: str, keyword: str) -> bool:
+    """
+    Check if a SQL string starts with a given keyword, ignoring leading comments.
+
+    Only the first few characters after the comments are upper-cased, so this is cheap
+    even for very long queries, and doesn't require tokenizing them with sqlparse.
+
+    :param sql: SQL string
+    :param keyword: upper case keyword
+    :return: True if the first word of the SQL starts with the keyword
+    """
+    match = RE_LEADING_COMMENTS.match(sql)
+    start = match.end() if match else 0
+    return sql[start : start + len(keyword)].upper() == keyword
 
 
 def get_cte_remainder_query(sql: str) -> tuple[Optional[str], str]:
@@ -191,6 +258,11 @@ def get_cte_remainder_query(sql: str) -> tuple[Optional[str], str]:
     """
     cte: Optional[str] = None
     remainder = sql
+
+    # avoid parsing the query when it can't start with a CTE
+    if not _starts_with_keyword(sql, "WITH"):
+        return cte, remainder
+
     stmt = sqlparse.parse(sql)[0]
 
     # The first meaningful token for CTE will be with WITH
@@ -207,21 +279,24 @@ def get_cte_remainder_query(sql: str) -> tuple[Optional[str], str]:
     return cte, remainder
 
 
-def strip_comments_from_sql(statement: str, engine: Optional[str] = None) -> str:
+def strip_comments_from_sql(  # pylint: disable=unused-argument
+    statement: str, engine: Optional[str] = None
+) -> str:
     """
     Strips comments from a SQL statement, does a simple test first
-    to avoid always instantiating the expensive ParsedQuery constructor
+    to avoid always running the expensive sqlparse formatter
 
     This is useful for engines that don't support comments
 
     :param statement: A string with the SQL statement
+    :param engine: Unused, accepted for API compatibility
     :return: SQL statement without comments
     """
-    return (
-        ParsedQuery(statement, engine=engine).strip_comments()
-        if "--" in statement
-        else statement
-    )
+    if "--" not in statement and "/*" not in statement:
+        return statement
+
+    # same as ``ParsedQuery(statement).strip_comments()``, without parsing the query
+    return _strip_comments(statement.strip(" \t\r\n;"))
 
 
 @dataclass(eq=True, frozen=True)
@@ -234,19 +309,62 @@ class Table:
     schema: Optional[str] = None
     catalog: Optional[str] = None
 
+    # the fully qualified name is used for equality and hashing, so it's computed
+    # only once, when the (immutable) table is created; it's set on the instance, but
+    # declared as a ``ClassVar`` so that it's not a dataclass field and doesn't show
+    # up in ``dataclasses.fields`` or ``asdict``
+    _str: ClassVar[str]
+
+    def __post_init__(self) -> None:
+        object.__setattr__(
+            self,
+            "_str",
+            ".".join(
+                part
+                if RE_SAFE_IDENTIFIER.fullmatch(part)
+                else urllib.parse.quote(part, safe="").replace(".", "%2E")
+                for part in [self.catalog, self.schema, self.table]
+                if part
+            ),
+        )
+
     def __str__(self) -> str:
         """
         Return the fully qualified SQL table name.
         """
 
-        return ".".join(
-            urllib.parse.quote(part, safe="").replace(".", "%2E")
-            for part in [self.catalog, self.schema, self.table]
-            if part
-        )
+        return self._str
 
     def __eq__(self, __o: object) -> bool:
-        return str(self) == str(__o)
+        if isinstance(__o, Table):
+            return self._str == __o._str
+        return self._str == str(__o)
+
+    def __hash__(self) -> int:
+        return hash(self._str)
+
+    @classmethod
+    def get(
+        cls,
+        table: str,
+        schema: Optional[str] = None,
+        catalog: Optional[str] = None,
+    ) -> "Table":
+        """
+        Return a shared instance of the table.
+
+        Queries often reference the same tables over and over, so instead of building
+        (and quoting the name of) a new instance every time, live instances are reused.
+        """
+        key = (table, schema, catalog)
+        if (instance := _interned_tables.get(key)) is None:
+            instance = _interned_tables[key] = cls(table, schema, catalog)
+        return instance
+
+
+_interned_tables: WeakValueDictionary[
+    tuple[str, Optional[str], Optional[str]], Table
+] = WeakValueDictionary()
 
 
 class ParsedQuery:
@@ -257,13 +375,14 @@ class ParsedQuery:
         engine: Optional[str] = None,
     ):
         if strip_comments:
-            sql_statement = sqlparse.format(sql_statement, strip_comments=True)
+            sql_statement = _strip_comments(sql_statement)
 
         self.sql: str = sql_statement
         self._dialect = SQLGLOT_DIALECTS.get(engine) if engine else None
-        self._tables: set[Table] = set()
+        self._tables: Optional[set[Table]] = None
         self._alias_names: set[str] = set()
         self._limit: Optional[int] = None
+        self._parsed_without_comments: Optional[tuple[Statement, ...]] = None
 
         logger.debug("Parsing with sqlparse statement: %s", self.sql)
         self._parsed = sqlparse.parse(self.stripped())
@@ -272,7 +391,7 @@ class ParsedQuery:
 
     @property
     def tables(self) -> set[Table]:
-        if not self._tables:
+        if self._tables is None:
             self._tables = self._extract_tables_from_sql()
         return self._tables
 
@@ -291,8 +410,8 @@ class ParsedQuery:
         return {
             table
             for statement in statements
-            for table in self._extract_tables_from_statement(statement)
             if statement
+            for table in self._extract_tables_from_statement(statement)
         }
 
     def _extract_tables_from_statement(self, statement: exp.Expression) -> set[Table]:
@@ -323,15 +442,19 @@ class ParsedQuery:
             pseudo_query = parse_one(f"SELECT {literal.this}", dialect=self._dialect)
             sources = pseudo_query.find_all(exp.Table)
         else:
-            sources = [
-                source
-                for scope in traverse_scope(statement)
-                for source in scope.sources.values()
-                if isinstance(source, exp.Table) and not self._is_cte(source, scope)
-            ]
+            table_sources: list[exp.Table] = []
+            for scope in traverse_scope(statement):
+                ctes_in_scope = self._get_ctes_in_scope(scope)
+                table_sources.extend(
+                    source
+                    for source in scope.sources.values()
+                    if isinstance(source, exp.Table)
+                    and source.name not in ctes_in_scope
+                )
+            sources = table_sources
 
         return {
-            Table(
+            Table.get(
                 source.name,
                 source.db if source.db != "" else None,
                 source.catalog if source.catalog != "" else None,
@@ -340,9 +463,9 @@ class ParsedQuery:
         }
 
     # pylint: disable=no-self-use
-    def _is_cte(self, source: exp.Table, scope: Scope) -> bool:
+    def _get_ctes_in_scope(self, scope: Scope) -> set[str]:
         """
-        Is the source a CTE?
+        Return the names of the CTEs visible in a scope.
 
         CTEs in the parent scope look like tables (and are represented by
         exp.Table objects), but should not be considered as such;
@@ -351,17 +474,17 @@ class ParsedQuery:
 
             WITH foo AS (SELECT * FROM target_table) SELECT * FROM foo
 
+        The names are the same for every source in the scope, so they're computed
+        once per scope.
         """
         parent_sources = scope.parent.sources if scope.parent else {}
-        ctes_in_scope = {
+        return {
             name
             for name, parent_scope in parent_sources.items()
             if isinstance(parent_scope, Scope)
             and parent_scope.scope_type == ScopeType.CTE
         }
 
-        return source.name in ctes_in_scope
-
     @property
     def limit(self) -> Optional[int]:
         return self._limit
@@ -396,12 +519,16 @@ class ParsedQuery:
 
     def is_select(self) -> bool:
         # make sure we strip comments; prevents a bug with comments in the CTE
-        parsed = sqlparse.parse(self.strip_comments())
+        parsed = self._get_parsed_without_comments()
+
+        # sqloxide parses the whole query, so its CTE check only needs to run once
+        checked_ctes_with_sqloxide = False
 
         for statement in parsed:
             # Check if this is a CTE
             if statement.is_group and statement[0].ttype == Keyword.CTE:
-                if sqloxide_parse is not None:
+                if sqloxide_parse is not None and not checked_ctes_with_sqloxide:
+                    checked_ctes_with_sqloxide = True
                     try:
                         if not self._check_cte_is_select(
                             sqloxide_parse(self.strip_comments(), dialect="ansi")
@@ -445,6 +572,17 @@ class ParsedQuery:
 
         return True
 
+    def _get_parsed_without_comments(self) -> tuple[Statement, ...]:
+        """
+        Return the statements without comments, parsed by sqlparse.
+
+        The result is shared by ``is_select``, ``is_valid_ctas`` and ``is_valid_cvas``,
+        so it's computed only once. It must not be modified.
+        """
+        if self._parsed_without_comments is None:
+            self._parsed_without_comments = sqlparse.parse(self.strip_comments())
+        return self._parsed_without_comments
+
     def get_inner_cte_expression(self, tokens: TokenList) -> Optional[TokenList]:
         for token in tokens:
             if self._is_identifier(token):
@@ -457,37 +595,24 @@ class ParsedQuery:
         return None
 
     def is_valid_ctas(self) -> bool:
-        parsed = sqlparse.parse(self.strip_comments())
+        parsed = self._get_parsed_without_comments()
         return parsed[-1].get_type() == "SELECT"
 
     def is_valid_cvas(self) -> bool:
-        parsed = sqlparse.parse(self.strip_comments())
+        parsed = self._get_parsed_without_comments()
         return len(parsed) == 1 and parsed[0].get_type() == "SELECT"
 
     def is_explain(self) -> bool:
-        # Remove comments
-        statements_without_comments = sqlparse.format(
-            self.stripped(), strip_comments=True
-        )
-
         # Explain statements will only be the first statement
-        return statements_without_comments.upper().startswith("EXPLAIN")
+        return _starts_with_keyword(self.stripped(), "EXPLAIN")
 
     def is_show(self) -> bool:
-        # Remove comments
-        statements_without_comments = sqlparse.format(
-            self.stripped(), strip_comments=True
-        )
         # Show statements will only be the first statement
-        return statements_without_comments.upper().startswith("SHOW")
+        return _starts_with_keyword(self.stripped(), "SHOW")
 
     def is_set(self) -> bool:
-        # Remove comments
-        statements_without_comments = sqlparse.format(
-            self.stripped(), strip_comments=True
-        )
         # Set statements will only be the first statement
-        return statements_without_comments.upper().startswith("SET")
+        return _starts_with_keyword(self.stripped(), "SET")
 
     def is_unknown(self) -> bool:
         return self._parsed[0].get_type() == "UNKNOWN"
@@ -496,7 +621,7 @@ class ParsedQuery:
         return self.sql.strip(" \t\r\n;")
 
     def strip_comments(self) -> str:
-        return sqlparse.format(self.stripped(), strip_comments=True)
+        return _strip_comments(self.stripped())
 
     def get_statements(self) -> list[str]:
         """Returns a list of SQL statements as strings, stripped"""
@@ -531,8 +656,13 @@ class ParsedQuery:
 
         if (
             len(tokens) in (1, 3, 5)
-            and all(imt(token, t=[Name, String]) for token in tokens[::2])
-            and all(imt(token, m=(Punctuation, ".")) for token in tokens[1::2])
+            and all(
+                token.ttype in Name or token.ttype in String for token in tokens[::2]
+            )
+            and all(
+                token.ttype is Punctuation and token.value == "."
+                for token in tokens[1::2]
+            )
         ):
             return Table(*[remove_quotes(token.value) for token in tokens[::-2]])
 
@@ -580,13 +710,8 @@ class ParsedQuery:
         """
         if not self._limit:
             return f"{self.stripped()}\nLIMIT {new_limit}"
-        limit_pos = None
         statement = self._parsed[0]
-        # Add all items to before_str until there is a limit
-        for pos, item in enumerate(statement.tokens):
-            if item.ttype in Keyword and item.value.lower() == "limit":
-                limit_pos = pos
-                break
+        limit_pos, _ = statement.token_next_by(m=(Keyword, "LIMIT"))
         _, limit = statement.token_next(idx=limit_pos)
         # Override the limit only when it exceeds the configured value.
         if limit.ttype == sqlparse.tokens.Literal.Number.Integer and (
@@ -596,13 +721,17 @@ class ParsedQuery:
         elif limit.is_group:
             limit.value = f"{next(limit.get_identifiers())}, {new_limit}"
 
-        str_res = ""
-        for i in statement.tokens:
-            str_res += str(i.value)
-        return str_res
+        # ``str(statement)`` can't be used, since it's built from the leaf tokens and
+        # the new limit might have been set in a group
+        return "".join(str(token.value) for token in statement.tokens)
 
 
 def sanitize_clause(clause: str) -> str:
+    # Without statement separators, parentheses or comment markers none of the checks
+    # below can fail, so there's no need to tokenize the clause
+    if clause.strip() and not any(char in clause for char in SANITIZE_CLAUSE_CHARS):
+        return clause
+
     # clause = sqlparse.format(clause, strip_comments=True)
     statements = sqlparse.parse(clause)
     if len(statements) != 1:
@@ -657,29 +786,33 @@ def has_table_query(token_list: TokenList) -> bool:
         False
 
     """
-    state = InsertRLSState.SCANNING
-    for token in token_list.tokens:
-        # Ignore comments
-        if isinstance(token, sqlparse.sql.Comment):
-            continue
+    # Each token list is scanned independently, so instead of recursing child token
+    # lists are added to a stack and scanned later
+    token_lists = [token_list]
+    while token_lists:
+        state = InsertRLSState.SCANNING
+        for token in token_lists.pop().tokens:
+            # Ignore comments
+            if isinstance(token, sqlparse.sql.Comment):
+                continue
 
-        # Recurse into child token list
-        if isinstance(token, TokenList) and has_table_query(token):
-            return True
+            # Scan child token list later
+            if isinstance(token, TokenList):
+                token_lists.append(token)
 
-        # Found a source keyword (FROM/JOIN)
-        if imt(token, m=[(Keyword, "FROM"), (Keyword, "JOIN")]):
-            state = InsertRLSState.SEEN_SOURCE
+            # Found a source keyword (FROM/JOIN)
+            if token.ttype is Keyword and token.normalized in SOURCE_KEYWORDS:
+                state = InsertRLSState.SEEN_SOURCE
 
-        # Found identifier/keyword after FROM/JOIN
-        elif state == InsertRLSState.SEEN_SOURCE and (
-            isinstance(token, sqlparse.sql.Identifier) or token.ttype == Keyword
-        ):
-            return True
+            # Found identifier/keyword after FROM/JOIN
+            elif state == InsertRLSState.SEEN_SOURCE and (
+                isinstance(token, sqlparse.sql.Identifier) or token.ttype == Keyword
+            ):
+                return True
 
-        # Found nothing, leaving source
-        elif state == InsertRLSState.SEEN_SOURCE and token.ttype != Whitespace:
-            state = InsertRLSState.SCANNING
+            # Found nothing, leaving source
+            elif state == InsertRLSState.SEEN_SOURCE and token.ttype != Whitespace:
+                state = InsertRLSState.SCANNING
 
     return False
 
@@ -759,14 +892,15 @@ def insert_rls(
     """
     rls: Optional[TokenList] = None
     state = InsertRLSState.SCANNING
-    for token in token_list.tokens:
+    # Tokens are inserted while iterating; ``enumerate`` stays in step with the list
+    # iterator, so ``i`` is always the index of the current token.
+    for i, token in enumerate(token_list.tokens):
         # Recurse into child token list
         if isinstance(token, TokenList):
-            i = token_list.tokens.index(token)
             token_list.tokens[i] = insert_rls(token, database_id, default_schema)
 
         # Found a source keyword (FROM/JOIN)
-        if imt(token, m=[(Keyword, "FROM"), (Keyword, "JOIN")]):
+        if token.ttype is Keyword and token.normalized in SOURCE_KEYWORDS:
             state = InsertRLSState.SEEN_SOURCE
 
         # Found identifier/keyword after FROM/JOIN, test for table
@@ -809,7 +943,6 @@ def insert_rls(
                 Token(Whitespace, " "),
                 Token(Punctuation, "("),
             ]
-            i = token_list.tokens.index(token)
             token.parent.tokens[i + 1 : i + 1] = tokens
             i += len(tokens) + 2
 
@@ -819,9 +952,7 @@ def insert_rls(
                 # scan until we hit a non-comparison keyword (like ORDER BY) or a WHERE
                 if (
                     sibling.ttype == Keyword
-                    and not imt(
-                        sibling, m=[(Keyword, "AND"), (Keyword, "OR"), (Keyword, "NOT")]
-                    )
+                    and sibling.normalized not in LOGICAL_OPERATORS
                     or isinstance(sibling, Where)
                 ):
                     j -= 1
@@ -836,7 +967,6 @@ def insert_rls(
 
         # Found table but no WHERE clause found, insert one
         elif state == InsertRLSState.FOUND_TABLE and token.ttype != Whitespace:
-            i = token_list.tokens.index(token)
             token_list.tokens[i:i] = [
                 Token(Whitespace, " "),
                 Where([Token(Keyword, "WHERE"), Token(Whitespace, " "), rls]),
@@ -880,28 +1010,66 @@ SQLOXIDE_DIALECTS = {
     "sqlite": {"sqlite", "gsheets", "shillelagh"},
     "clickhouse": {"clickhouse"},
 }
+SQLOXIDE_DIALECT_BY_SQLA_DIALECT = {
+    sqla_dialect: dialect
+    for dialect, sqla_dialects in SQLOXIDE_DIALECTS.items()
+    for sqla_dialect in sqla_dialects
+}
 
 RE_JINJA_VAR = re.compile(r"\{\{[^\{\}]+\}\}")
 RE_JINJA_BLOCK = re.compile(r"\{[%#][^\{\}%#]+[%#]\}")
+RE_JINJA = re.compile(f"(?P<var>{RE_JINJA_VAR.pattern})|{RE_JINJA_BLOCK.pattern}")
+
+
+def _replace_jinja(match: re.Match[str]) -> str:
+    """
+    Replace Jinja variables with a dummy identifier and blocks with a space.
+    """
+    return "abc" if match.group("var") else " "
+
+
+def find_nodes_by_key(element: Any, target: str) -> Iterator[Any]:
+    """
+    Find all nodes in a SQL tree matching a given key.
+
+    The tree is walked with an explicit stack instead of recursion, since sqloxide
+    trees can be deep and a generator frame per node is expensive. Matching nodes are
+    not walked further.
+    """
+    elements = [element]
+    while elements:
+        element = elements.pop()
+        # sqloxide only builds plain lists and dicts, so subclasses need not be checked
+        element_type = type(element)
+        if element_type is list:
+            elements.extend(element)
+        elif element_type is dict:
+            # most nodes don't have the key, so their children can be added at once
+            if target not in element:
+                elements.extend(element.values())
+                continue
+            for key, value in element.items():
+                if key == target:
+                    yield value
+                else:
+                    elements.append(value)
 
 
 def extract_table_references(
     sql_text: str, sqla_dialect: str, show_warning: bool = True
-) -> set["Table"]:
+) -> frozenset["Table"]:
     """
     Return all the dependencies from a SQL sql_text.
     """
-    dialect = "generic"
-    tree = None
+    tables: Optional[frozenset[Table]] = None
 
     if sqloxide_parse:
-        for dialect, sqla_dialects in SQLOXIDE_DIALECTS.items():
-            if sqla_dialect in sqla_dialects:
-                break
-        sql_text = RE_JINJA_BLOCK.sub(" ", sql_text)
-        sql_text = RE_JINJA_VAR.sub("abc", sql_text)
+        dialect = SQLOXIDE_DIALECT_BY_SQLA_DIALECT.get(sqla_dialect, "generic")
+        # most queries have no Jinja, so avoid scanning them with the regex
+        if "{" in sql_text:
+            sql_text = RE_JINJA.sub(_replace_jinja, sql_text)
         try:
-            tree = sqloxide_parse(sql_text, dialect=dialect)
+            tables = _get_sqloxide_tables(sql_text, dialect)
         except Exception as ex:  # pylint: disable=broad-except
             if show_warning:
                 logger.warning(
@@ -909,25 +1077,40 @@ def extract_table_references(
                 )
 
     # fallback to sqlparse
-    if not tree:
-        parsed = ParsedQuery(sql_text)
-        return parsed.tables
+    if tables is None:
+        return _get_sqlparse_tables(sql_text)
 
-    def find_nodes_by_key(element: Any, target: str) -> Iterator[Any]:
-        """
-        Find all nodes in a SQL tree matching a given key.
-        """
-        if isinstance(element, list):
-            for child in element:
-                yield from find_nodes_by_key(child, target)
-        elif isinstance(element, dict):
-            for key, value in element.items():
-                if key == target:
-                    yield value
-                else:
-                    yield from find_nodes_by_key(value, target)
+    return tables
 
-    return {
-        Table(*[part["value"] for part in table["name"][::-1]])
+
+@lru_cache(maxsize=LRU_CACHE_MAX_SIZE)
+def _get_sqloxide_tables(sql_text: str, dialect: str) -> Optional[frozenset[Table]]:
+    """
+    Return all the tables referenced in a SQL sql_text, using sqloxide.
+
+    The result only depends on the SQL and the dialect, so it's cached; this saves
+    parsing the same queries over and over. Parsing errors are raised (and therefore
+    not cached), and ``None`` is returned if sqloxide finds no statements.
+    """
+    tree = sqloxide_parse(sql_text, dialect=dialect)
+    if not tree:
+        return None
+
+    # names are interned since the same identifiers are referenced over and over, and
+    # the results are kept in the cache
+    return frozenset(
+        Table.get(*(sys.intern(part["value"]) for part in reversed(table["name"])))
         for table in find_nodes_by_key(tree, "Table")
-    }
+    )
+
+
+@lru_cache(maxsize=LRU_CACHE_MAX_SIZE)
+def _get_sqlparse_tables(sql_text: str) -> frozenset[Table]:
+    """
+    Return all the tables referenced in a SQL sql_text, using sqlparse.
+
+    This is the slow path, so it's cached as well, in case sqloxide keeps failing
+    on the same query.
+    """
+    parsed = ParsedQuery(sql_text)
+    return frozenset(parsed.tables)
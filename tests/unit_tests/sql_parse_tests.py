@@ -16,6 +16,7 @@
 # under the License.
 # pylint: disable=invalid-name, redefined-outer-name, unused-argument, protected-access, too-many-lines
 
+from dataclasses import asdict
 from typing import Optional
 
 import pytest
@@ -25,10 +26,14 @@ from sqlalchemy import text
 from sqlparse.sql import Identifier, Token, TokenList
 from sqlparse.tokens import Name
 
+from superset import sql_parse
 from superset.exceptions import QueryClauseValidationException
 from superset.sql_parse import (
     add_table_name,
     extract_table_references,
+    extract_top_from_query,
+    find_nodes_by_key,
+    get_cte_remainder_query,
     get_rls_for_table,
     has_table_query,
     insert_rls,
@@ -64,6 +69,34 @@ def test_table() -> None:
     )
 
 
+def test_table_eq_and_hash() -> None:
+    """
+    Test that tables are compared and hashed by their fully qualified name.
+    """
+    assert Table("tbname", "schemaname") == Table("tbname", "schemaname")
+    assert Table("tbname", "schemaname") != Table("tbname")
+    assert Table("tbname", "schemaname") == "schemaname.tbname"
+    assert hash(Table("tbname", "schemaname")) == hash(Table("tbname", "schemaname"))
+    assert len({Table("tbname"), Table("tbname"), Table("tbname", "schemaname")}) == 2
+
+    # the cached name is not part of the dataclass fields
+    assert asdict(Table("tbname", "schemaname")) == {
+        "table": "tbname",
+        "schema": "schemaname",
+        "catalog": None,
+    }
+
+
+def test_table_get() -> None:
+    """
+    Test that ``Table.get`` reuses live instances.
+    """
+    table = Table.get("tbname", "schemaname")
+    assert Table.get("tbname", "schemaname") is table
+    assert Table.get("tbname", "schemaname", "catalogname") is not table
+    assert Table.get("tbname", "schemaname") == Table("tbname", "schemaname")
+
+
 def test_extract_tables() -> None:
     """
     Test that referenced tables are parsed correctly from the SQL.
@@ -786,6 +819,35 @@ SHOW LOCKS test EXTENDED;
     assert ParsedQuery("SELECT 1").is_show() is False
 
 
+@pytest.mark.parametrize(
+    "sql,is_explain,is_show,is_set",
+    [
+        ("/* comment */ EXPLAIN SELECT 1", True, False, False),
+        ("/*comment*/EXPLAIN SELECT 1", True, False, False),
+        ("/*\nmulti\nline\n*/\n\tSHOW TABLES", False, True, False),
+        ("# comment\nSHOW TABLES", False, True, False),
+        ("#comment\nSHOW TABLES", False, False, False),
+        ("--+hint\r\nSET a=1", False, False, True),
+        ("-- a\n  /* b */ -- c\n\nset a=1", False, False, True),
+        ("/* unterminated SET a=1", False, False, False),
+        ("SELECT 1 -- SET a=1", False, False, False),
+    ],
+)
+def test_leading_comments(
+    sql: str,
+    is_explain: bool,
+    is_show: bool,
+    is_set: bool,
+) -> None:
+    """
+    Test that leading comments are skipped when detecting the statement type.
+    """
+    query = ParsedQuery(sql)
+    assert query.is_explain() is is_explain
+    assert query.is_show() is is_show
+    assert query.is_set() is is_set
+
+
 def test_is_explain() -> None:
     """
     Test that ``EXPLAIN`` is detected correctly.
@@ -1131,6 +1193,18 @@ def test_cte_with_multiple_with_non_select() -> None:
     assert sql.is_select() is False
 
 
+def test_cte_is_select_sqloxide_parsed_once(mocker: MockerFixture) -> None:
+    """
+    Test that the query is parsed only once with sqloxide, even with multiple CTEs.
+    """
+    sqloxide_parse = mocker.spy(sql_parse, "sqloxide_parse")
+    sql = ParsedQuery(
+        "WITH a AS (SELECT 1) SELECT * FROM a; WITH b AS (SELECT 2) SELECT * FROM b"
+    )
+    assert sql.is_select()
+    sqloxide_parse.assert_called_once()
+
+
 def test_unknown_select() -> None:
     """
     Test that `is_select` works when sqlparse fails to identify the type.
@@ -1188,6 +1262,78 @@ def test_get_query_with_new_limit_upper() -> None:
     )
 
 
+@pytest.mark.parametrize(
+    "sql,top_keywords,expected",
+    [
+        ("SELECT TOP 10 * FROM my_table", {"TOP"}, 10),
+        ("select top 10 * from my_table", {"TOP"}, 10),
+        ("SELECT\r\nTOP\r\n100 * FROM my_table", {"TOP"}, 100),
+        ("SELECT SAMPLE 5 * FROM my_table", {"TOP", "SAMPLE"}, 5),
+        # any whitespace separates the keyword, not only spaces and newlines
+        ("SELECT\tTOP\t10 * FROM my_table", {"TOP"}, 10),
+        ("SELECT TOP\r10 * FROM my_table", {"TOP"}, 10),
+        ("SELECT x\xa0TOP 10 * FROM my_table", {"TOP"}, 10),
+        ("SELECT TOP abc FROM my_table", {"TOP"}, None),
+        ("SELECT TOP(10) * FROM my_table", {"TOP"}, None),
+        ("SELECT * FROM my_table WHERE stop = 10", {"TOP"}, None),
+        ("SELECT * FROM my_table TOP", {"TOP"}, None),
+        ("SELECT * FROM my_table", {"TOP"}, None),
+        ("SELECT  10 FROM my_table LIMIT  5", set(), None),
+        ("SELECT top 10 * FROM my_table", {"top"}, None),
+    ],
+)
+def test_extract_top_from_query(
+    sql: str,
+    top_keywords: set[str],
+    expected: Optional[int],
+) -> None:
+    """
+    Test that the TOP value is extracted correctly.
+    """
+    statement = sqlparse.parse(sql)[0]
+    assert extract_top_from_query(statement, top_keywords) == expected
+
+
+@pytest.mark.parametrize(
+    "sql,expected",
+    [
+        ("SELECT 1", (None, "SELECT 1")),
+        ("WITHIN GROUP", (None, "WITHIN GROUP")),
+        (
+            "WITH foo AS (SELECT 1) SELECT * FROM foo",
+            ("WITH foo AS (SELECT 1)", "SELECT * FROM foo"),
+        ),
+        (
+            "-- comment\n/* comment */ with foo AS (SELECT 1)\nSELECT * FROM foo",
+            ("WITH foo AS (SELECT 1)", "SELECT * FROM foo"),
+        ),
+    ],
+)
+def test_get_cte_remainder_query(
+    sql: str,
+    expected: tuple[Optional[str], str],
+) -> None:
+    """
+    Test that the CTE is split from the rest of the query.
+    """
+    assert get_cte_remainder_query(sql) == expected
+
+
+def test_get_query_with_new_limit_lowercase_and_offset() -> None:
+    """
+    Test that lowercase limits and limits with offsets are replaced.
+    """
+    query = ParsedQuery("select * from birth_names limit 2000")
+    assert query.set_or_update_query_limit(1000) == (
+        "select * from birth_names limit 1000"
+    )
+
+    query = ParsedQuery("SELECT * FROM birth_names LIMIT 10, 2000")
+    assert query.set_or_update_query_limit(1000) == (
+        "SELECT * FROM birth_names LIMIT 10, 1000"
+    )
+
+
 def test_basic_breakdown_statements() -> None:
     """
     Test that multiple statements are parsed correctly.
@@ -1254,6 +1400,10 @@ def test_strip_comments_from_sql() -> None:
         strip_comments_from_sql("SELECT '--abc' as abc, col2 FROM table1\n")
         == "SELECT '--abc' as abc, col2 FROM table1"
     )
+    assert (
+        strip_comments_from_sql("SELECT col1, col2 /* comment */ FROM table1")
+        == "SELECT col1, col2  FROM table1"
+    )
 
 
 def test_sanitize_clause_valid():
@@ -1272,6 +1422,9 @@ def test_sanitize_clause_valid():
     assert sanitize_clause("col = 'select 1; select 2'") == "col = 'select 1; select 2'"
     assert sanitize_clause("col = 'abc -- comment'") == "col = 'abc -- comment'"
 
+    # clauses that don't need to be tokenized
+    assert sanitize_clause("col = 'a' AND col2 > 1.5") == "col = 'a' AND col2 > 1.5"
+
 
 def test_sanitize_clause_closing_unclosed():
     with pytest.raises(QueryClauseValidationException):
@@ -1298,6 +1451,11 @@ def test_sanitize_clause_multiple():
         sanitize_clause("TRUE; SELECT 1")
 
 
+def test_sanitize_clause_empty():
+    with pytest.raises(QueryClauseValidationException):
+        sanitize_clause(" \n")
+
+
 def test_sqlparse_issue_652():
     stmt = sqlparse.parse(r"foo = '\' AND bar = 'baz'")[0]
     assert len(stmt.tokens) == 5
@@ -1599,6 +1757,22 @@ def test_get_rls_for_table(mocker: MockerFixture) -> None:
     assert get_rls_for_table(candidate, 1, "public") is None
 
 
+def test_find_nodes_by_key() -> None:
+    """
+    Test that matching nodes are found at any depth, but not walked further.
+    """
+    tree = [
+        {"Table": 1, "other": {"Table": 2}},
+        [[{"nested": [{"Table": {"Table": 3}}]}]],
+        "Table",
+    ]
+    assert sorted(find_nodes_by_key(tree, "Table"), key=str) == [
+        1,
+        2,
+        {"Table": 3},
+    ]
+
+
 def test_extract_table_references(mocker: MockerFixture) -> None:
     """
     Test the ``extract_table_references`` helper function.
@@ -1610,6 +1784,10 @@ def test_extract_table_references(mocker: MockerFixture) -> None:
     assert extract_table_references("SELECT {{ jinja }} FROM some_table", "trino") == {
         Table(table="some_table", schema=None, catalog=None)
     }
+    assert extract_table_references(
+        "SELECT 1 FROM some_table {% if x %}WHERE a = {{ b }}{% endif %} {# c #}",
+        "trino",
+    ) == {Table(table="some_table", schema=None, catalog=None)}
     assert extract_table_references(
         "SELECT 1 FROM some_catalog.some_schema.some_table", "trino"
     ) == {Table(table="some_table", schema="some_schema", catalog="some_catalog")}
@@ -1651,6 +1829,59 @@ def test_extract_table_references(mocker: MockerFixture) -> None:
     logger.warning.assert_not_called()
 
 
+@pytest.fixture
+def clear_table_caches() -> None:
+    """
+    Clear the caches of ``extract_table_references``, so that queries are parsed.
+    """
+    sql_parse._get_sqloxide_tables.cache_clear()
+    sql_parse._get_sqlparse_tables.cache_clear()
+
+
+def test_extract_table_references_cached(
+    mocker: MockerFixture, clear_table_caches: None
+) -> None:
+    """
+    Test that ``extract_table_references`` parses the same SQL only once.
+    """
+    sqloxide_parse = mocker.spy(sql_parse, "sqloxide_parse")
+    sql = "SELECT * FROM cached_table"
+    for _ in range(2):
+        tables = extract_table_references(sql, "trino")
+        assert tables == {Table("cached_table")}
+        # the cached result is shared, so it can't be modified by the caller
+        assert isinstance(tables, frozenset)
+    sqloxide_parse.assert_called_once()
+
+
+def test_extract_table_references_fallback_cached(
+    mocker: MockerFixture, clear_table_caches: None
+) -> None:
+    """
+    Test that the sqlparse fallback of ``extract_table_references`` is cached.
+    """
+    mocker.patch("superset.sql_parse.sqloxide_parse", None)
+    parsed_query = mocker.spy(sql_parse, "ParsedQuery")
+    sql = "SELECT * FROM fallback_table"
+    for _ in range(2):
+        assert extract_table_references(sql, "trino") == {Table("fallback_table")}
+    parsed_query.assert_called_once()
+
+
+def test_extract_table_references_dialect(
+    mocker: MockerFixture, clear_table_caches: None
+) -> None:
+    """
+    Test that the sqloxide dialect is picked from the SQLAlchemy dialect.
+    """
+    sqloxide_parse = mocker.spy(sql_parse, "sqloxide_parse")
+    sql = "SELECT * FROM dialect_table"
+    extract_table_references(sql, "postgresql")
+    sqloxide_parse.assert_called_with(sql, dialect="postgres")
+    extract_table_references(sql, "unknown")
+    sqloxide_parse.assert_called_with(sql, dialect="generic")
+
+
 def test_is_select() -> None:
     """
     Test `is_select`.